@@ -3,9 +3,24 @@ import tempfile
 import subprocess
 import shutil
 import os
+import fcntl
+import hashlib
+import contextlib
 import yaml
-from kubernetes import client, config
+from yaml import CSafeLoader, CSafeDumper
+import pygit2
+from pygit2.enums import CredentialType
+import docker
+from kubernetes import client, config, watch
 import time
+import random
+import string
+import functools
+import secrets
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from .runbook_agent import runbook_agent
 
 class CheckoutException(Exception):
@@ -23,37 +38,347 @@ class RollbackException(Exception):
 class MonitorException(Exception):
     pass
 
-def clone_repository_to_temp_dir(repository_url: str):
+_api_client = None
+_api_client_lock = threading.Lock()
+
+def _get_api_client():
+    """
+    Return the shared Kubernetes ApiClient, loading the kubeconfig on first use. Reusing one
+    client keeps its connections to the API server alive between tool calls.
+    """
+    global _api_client
+    with _api_client_lock:
+        if _api_client is None:
+            configuration = client.Configuration()
+            config.load_kube_config(client_configuration=configuration)
+            configuration.connection_pool_maxsize = 32
+            _api_client = client.ApiClient(configuration)
+    return _api_client
+
+def _warm_api_client():
+    """
+    Load the kubeconfig, run any exec credential plugin and open a pooled connection to the API server,
+    so the first tool call does not pay for them. load_kube_config installs a refresh_api_key_hook on the
+    shared configuration, so the plugin's token is reused until it expires.
+    """
+    try:
+        client.VersionApi(_get_api_client()).get_code(_request_timeout=5)
+    except Exception:
+        pass
+
+# Warm up in the background so importing the agent never waits on an unreachable cluster
+threading.Thread(target=_warm_api_client, daemon=True).start()
+
+# Address the cluster's pods use to reach this agent. When set, deployments get a sidecar that
+# reports readiness back to the agent without going through the API server.
+READY_CALLBACK_HOST = os.environ.get("DEPLOYMENT_READY_CALLBACK_HOST")
+
+# Deployments whose file carries a readiness sidecar, keyed by the secret token in their callback url,
+# and those whose pod has called back since the last deploy
+_ready_tokens = {}
+_ready_reported = set()
+_ready_cond = threading.Condition()
+_ready_server = None
+
+class _ReadyHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        parts = self.path.strip("/").split("/")
+        with _ready_cond:
+            key = _ready_tokens.get(parts[1]) if len(parts) == 2 and parts[0] == "ready" else None
+            if key is not None:
+                _ready_reported.add(key)
+                _ready_cond.notify_all()
+        if key is None:
+            self.send_response(404)
+            self.end_headers()
+            return
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+def _ready_callback_url(token: str):
+    global _ready_server
+    with _ready_cond:
+        if _ready_server is None:
+            _ready_server = ThreadingHTTPServer(("0.0.0.0", 0), _ReadyHandler)
+            threading.Thread(target=_ready_server.serve_forever, daemon=True).start()
+        port = _ready_server.server_address[1]
+    return f"http://{READY_CALLBACK_HOST}:{port}/ready/{token}"
+
+def _add_ready_sidecar(dep: dict, callback_url: str):
+    """
+    Add a sidecar that POSTs to the callback url once the main container's port accepts connections.
+    Returns:
+        Whether the sidecar was added.
+    """
+    pod_spec = dep['spec']['template']['spec']
+    ports = pod_spec['containers'][0].get('ports') or []
+    if not ports:
+        return False
+    port = ports[0]['containerPort']
+    pod_spec['containers'].append({
+        "name": "ready-callback",
+        "image": "curlimages/curl:latest",
+        "env": [{"name": "CALLBACK_URL", "value": callback_url}],
+        "command": [
+            "sh", "-c",
+            f'until nc -z 127.0.0.1 {port}; do sleep 0.1; done; '
+            'curl -fsS -X POST "$CALLBACK_URL"; while true; do sleep 3600; done',
+        ],
+    })
+    return True
+
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+with open(os.path.join(PROJECT_ROOT, "deployment_template.yaml"), "r") as f:
+    _DEPLOYMENT_TEMPLATE = string.Template(f.read())
+
+@functools.lru_cache(maxsize=None)
+def _render_deployment_template(branch_name: str, deployment_name: str):
+    return _DEPLOYMENT_TEMPLATE.substitute(branch_name=branch_name, deployment_name=deployment_name)
+
+# Parsed deployment files with the mtime they were parsed at, keyed by path, so deploys do not have to
+# read back what create_deployment_file wrote but still pick up edits made to the file afterwards
+_manifests = {}
+
+def _parse_manifest(stream):
+    return [doc for doc in yaml.load_all(stream, Loader=CSafeLoader) if doc]
+
+def _load_manifest(deployment_file: str):
+    mtime_ns = os.stat(deployment_file).st_mtime_ns
+    cached = _manifests.get(deployment_file)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    with open(deployment_file) as f:
+        docs = _parse_manifest(f)
+    _manifests[deployment_file] = (mtime_ns, docs)
+    return docs
+
+FIELD_MANAGER = "devops-agent"
+
+# Kinds that can be applied from a deployment file, with the typed API and patch method for each
+_APPLY_METHODS = {
+    "Deployment": (client.AppsV1Api, "patch_namespaced_deployment"),
+    "StatefulSet": (client.AppsV1Api, "patch_namespaced_stateful_set"),
+    "Service": (client.CoreV1Api, "patch_namespaced_service"),
+    "ConfigMap": (client.CoreV1Api, "patch_namespaced_config_map"),
+    "Secret": (client.CoreV1Api, "patch_namespaced_secret"),
+}
+
+def _server_side_apply(doc: dict, namespace: str):
+    if doc.get('kind') not in _APPLY_METHODS:
+        raise DeploymentException(f"Unsupported kind {doc.get('kind')} in the deployment file.")
+    api_class, method = _APPLY_METHODS[doc['kind']]
+    getattr(api_class(_get_api_client()), method)(
+        name=doc['metadata']['name'],
+        namespace=namespace,
+        body=doc,
+        field_manager=FIELD_MANAGER,
+        force=True,
+        _content_type="application/apply-patch+yaml",
+    )
+
+# Clones go to tmpfs when it is available and has room, so removing them never touches the disk
+TEMP_ROOT = "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+def _temp_root(mirror_path: str):
+    if TEMP_ROOT is None:
+        return None
+    # The clone copies the mirror's objects into the new repository and adds a checkout next to them
+    mirror_size = sum(
+        os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(mirror_path) for name in names
+    )
+    stat = os.statvfs(TEMP_ROOT)
+    return TEMP_ROOT if stat.f_bavail * stat.f_frsize > 2 * mirror_size else None
+
+_cleanup_executor = ThreadPoolExecutor(max_workers=1)
+
+# Directories created by mkdtemp for clones, so cleanup can remove them rather than only the clone inside
+_temp_dirs = set()
+
+MIRROR_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "devops-agent", "mirrors")
+
+@contextlib.contextmanager
+def _mirror_lock(mirror_path: str, operation: int):
+    with open(f"{mirror_path}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _credential_fill(url: str):
+    # Ask git's configured credential helpers, without ever prompting, for the url's username and password
+    result = subprocess.run(
+        ["git", "credential", "fill"], input=f"url={url}\n\n", capture_output=True, text=True, check=True,
+        env={**os.environ, "GIT_TERMINAL_PROMPT": "0"},
+    )
+    fields = dict(line.split("=", 1) for line in result.stdout.splitlines() if "=" in line)
+    return fields.get("username", ""), fields.get("password", "")
+
+class _GitCredentials(pygit2.RemoteCallbacks):
+    """
+    Authenticate fetches the way the git CLI would: ssh-agent for SSH urls and the configured
+    credential helpers for HTTPS. Each method is tried once, so a rejected credential fails the fetch.
+    """
+    def __init__(self):
+        super().__init__()
+        self._tried = set()
+
+    def credentials(self, url, username_from_url, allowed_types):
+        if allowed_types & CredentialType.SSH_KEY and "ssh" not in self._tried:
+            self._tried.add("ssh")
+            return pygit2.KeypairFromAgent(username_from_url or "git")
+        if allowed_types & CredentialType.USERPASS_PLAINTEXT and "userpass" not in self._tried:
+            self._tried.add("userpass")
+            return pygit2.UserPass(*_credential_fill(url))
+        raise pygit2.GitError(f"Authentication failed for {url}")
+
+def ensure_mirror(repository_url: str, branch_name: str):
     """
-    Clone the repository to a temporary directory.
+    Create or update the local mirror of the repository. Only the given branch is fetched.
+    Args:
+        repository_url: The url of the repository to mirror.
+        branch_name: The name of the branch to fetch into the mirror.
+    Returns:
+        The path to the mirror.
+    """
+    os.makedirs(MIRROR_CACHE_DIR, exist_ok=True)
+    mirror_path = os.path.join(MIRROR_CACHE_DIR, f"{hashlib.sha256(repository_url.encode()).hexdigest()}.git")
+    with _mirror_lock(mirror_path, fcntl.LOCK_EX):
+        if os.path.isdir(mirror_path):
+            remote = pygit2.Repository(mirror_path).remotes["origin"]
+        else:
+            repo = pygit2.init_repository(mirror_path, bare=True)
+            remote = repo.remotes.create("origin", repository_url, "+refs/heads/*:refs/heads/*")
+        # proxy=True picks up http.proxy and the *_proxy environment variables like the git CLI does
+        remote.fetch([f"+refs/heads/{branch_name}:refs/heads/{branch_name}"], callbacks=_GitCredentials(), proxy=True)
+    return mirror_path
+
+async def _run_async(args: list, cwd: str = None, env: dict = None):
+    # Output is discarded on success, only stderr is kept to explain a failure
+    proc = await asyncio.create_subprocess_exec(
+        *args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+    )
+    _, stderr = await proc.communicate()
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, args, stderr=stderr)
+
+def _clone(repository_url: str, branch_name: str):
+    mirror_path = ensure_mirror(repository_url, branch_name)
+    temp_dir = tempfile.mkdtemp(dir=_temp_root(mirror_path))
+    _temp_dirs.add(temp_dir)
+    try:
+        with _mirror_lock(mirror_path, fcntl.LOCK_SH):
+            repo = pygit2.clone_repository(mirror_path, os.path.join(temp_dir, "agenticaitraining"), checkout_branch=branch_name)
+        repo.remotes.set_url("origin", repository_url)
+    except Exception:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        _temp_dirs.discard(temp_dir)
+        raise
+    return temp_dir
+
+async def _clone_async(repository_url: str, branch_name: str):
+    return await asyncio.to_thread(_clone, repository_url, branch_name)
+
+_docker_client = None
+_docker_client_lock = threading.Lock()
+
+def _get_docker_client():
+    """
+    Return the shared low-level docker client, so every push reuses one connection to the daemon.
+    """
+    global _docker_client
+    with _docker_client_lock:
+        if _docker_client is None:
+            _docker_client = docker.from_env().api
+    return _docker_client
+
+# Builds run on a BuildKit builder inside the cluster instead of the local docker daemon
+BUILDER_NAME = "devops-agent"
+
+_builder_ready = False
+_builder_lock = asyncio.Lock()
+
+async def _ensure_builder():
+    global _builder_ready
+    # Concurrent builds must not both try to create the builder
+    async with _builder_lock:
+        if _builder_ready:
+            return
+        try:
+            await _run_async(["docker", "buildx", "inspect", BUILDER_NAME])
+        except subprocess.CalledProcessError:
+            await _run_async(["docker", "buildx", "create", "--name", BUILDER_NAME, "--driver", "kubernetes"])
+        _builder_ready = True
+
+async def _build_async(image_tag: str, temp_dir: str, push: bool):
+    # Layers are cached in the registry next to the image, so unchanged layers are reused across deploys
+    cache_ref = f"{image_tag.rsplit(':', 1)[0]}:buildcache"
+    args = [
+        "docker", "buildx", "build",
+        "--builder", BUILDER_NAME,
+        "--quiet",
+        "--cache-from", f"type=registry,ref={cache_ref}",
+        "--cache-to", f"type=registry,ref={cache_ref},mode=max",
+        "-t", image_tag,
+        "--push" if push else "--load",
+        ".",
+    ]
+    await _run_async(args, cwd=temp_dir, env={**os.environ, "DOCKER_BUILDKIT": "1"})
+
+def _push(image_tag: str):
+    repository, tag = image_tag.rsplit(":", 1)
+    for event in _get_docker_client().push(repository, tag=tag, stream=True, decode=True):
+        if "error" in event:
+            raise BuildException(event["error"])
+
+async def _push_async(image_tag: str):
+    await asyncio.to_thread(_push, image_tag)
+
+async def clone_repository_to_temp_dir(repository_url: str, branch_name: str):
+    """
+    Clone the repository to a temporary directory from the local mirror, so only what changed
+    on the branch since the last clone is downloaded. The branch is checked out in the clone.
     Args:
         repository_url: The url of the repository to clone.
+        branch_name: The name of the branch to clone.
     Returns:
         The path to the temporary directory.
     """
-    temp_dir = tempfile.mkdtemp()
     try:
-        subprocess.run(["git", "clone", repository_url], cwd=temp_dir, check=True)
+        temp_dir = await _clone_async(repository_url, branch_name)
     except Exception as e:
-        shutil.rmtree(temp_dir)
+        raise CheckoutException(f'Failed to clone the branch {branch_name} of {repository_url}: {e}') from e
     return os.path.join(temp_dir, "agenticaitraining")
 
 def clean_up_temp_dir(temp_dir: str):
     """
-    Clean up the temporary directory.
+    Clean up the temporary directory. The directory is moved out of the way and removed in the background.
     Args:
         temp_dir: The path to the temporary directory.
     """
-    shutil.rmtree(temp_dir)
+    temp_dir = temp_dir.rstrip(os.sep)
+    # The agent passes the clone's path, remove the mkdtemp directory around it as well
+    if os.path.dirname(temp_dir) in _temp_dirs:
+        temp_dir = os.path.dirname(temp_dir)
+    _temp_dirs.discard(temp_dir)
+    trash_dir = f"{temp_dir}.trash"
+    os.rename(temp_dir, trash_dir)
+    # On Linux shutil.rmtree already walks with os.scandir on directory fds and unlinks with dir_fd
+    _cleanup_executor.submit(shutil.rmtree, trash_dir, ignore_errors=True)
 
-def checkout_branch(branch_name: str):
+async def checkout_branch(branch_name: str, repository_path: str):
     """
     Checkout the git branch.
     Args:
         branch_name: The name of the branch to checkout.
+        repository_path: The path to the cloned repository, as returned by clone_repository_to_temp_dir.
     """
     try:
-        subprocess.run(["git", "checkout", branch_name], check=True)
+        await _run_async(["git", "checkout", branch_name], cwd=repository_path)
     except Exception as e:
         raise CheckoutException(f'Failed to checkout to the branch {branch_name}.')
 
@@ -61,30 +386,20 @@ def checkout_branch(branch_name: str):
 def deploy_branch(deployment_file: str, environment: str, branch_name: str):
     """
     Deploy the git branch to the local cluster using the Kubernetes Python client.
+    Every object in the deployment file is applied server-side.
     Args:
         branch_name: The name of the branch to deploy.
         environment: The environment to deploy to.
     """
     try:
-        config.load_kube_config()
-        with open(deployment_file) as f:
-            dep = yaml.safe_load(f)
-        k8s_apps_v1 = client.AppsV1Api()
         namespace = environment
-        # Create or replace deployment
-        try:
-            k8s_apps_v1.create_namespaced_deployment(
-                body=dep, namespace=namespace
-            )
-        except client.exceptions.ApiException as e:
-            if e.status == 409:  # Already exists, replace
-                k8s_apps_v1.replace_namespaced_deployment(
-                    name=dep['metadata']['name'],
-                    namespace=namespace,
-                    body=dep
-                )
-            else:
-                raise
+        # Server-side apply creates or updates each object in a single request
+        for doc in _load_manifest(deployment_file):
+            if doc.get('kind') == "Deployment":
+                # A callback from before this deploy says nothing about the new rollout
+                with _ready_cond:
+                    _ready_reported.discard((namespace, doc['metadata']['name']))
+            _server_side_apply(doc, namespace)
     except Exception as e:
         raise DeploymentException(f'Failed to deploy the branch {branch_name}: {e}')
 
@@ -96,8 +411,7 @@ def rollback_branch(deployment_file: str, branch_name: str, environment: str, de
         environment: The environment to rollback from.
     """
     try:
-        config.load_kube_config()
-        k8s_apps_v1 = client.AppsV1Api()
+        k8s_apps_v1 = client.AppsV1Api(_get_api_client())
         namespace = environment
         # Rollout undo is not directly supported, so you may need to patch to previous revision if available
         # Here, we simply delete the deployment as a placeholder
@@ -105,44 +419,126 @@ def rollback_branch(deployment_file: str, branch_name: str, environment: str, de
     except Exception as e:
         raise RollbackException(f'Failed to rollback the branch {branch_name}: {e}')
     try:
+        _manifests.pop(deployment_file, None)
         os.remove(deployment_file)
     except Exception as e:
         raise Exception(f'Failed to delete the deployment file for the branch {branch_name}.')
 
+def _is_available(deployment):
+    if deployment.status and deployment.status.conditions:
+        for cond in deployment.status.conditions:
+            if cond.type == "Available" and cond.status == "True":
+                return True
+    return False
+
+def _wait_until_available(k8s_apps_v1, namespace: str, deployment_name: str, timeout: int):
+    deadline = time.time() + timeout
+    resource_version = None
+    while True:
+        w = watch.Watch()
+        kwargs = {
+            "namespace": namespace,
+            "field_selector": f"metadata.name={deployment_name}",
+            "timeout_seconds": max(1, int(deadline - time.time())),
+        }
+        if resource_version:
+            kwargs["resource_version"] = resource_version
+        try:
+            for event in w.stream(k8s_apps_v1.list_namespaced_deployment, **kwargs):
+                obj = event['object']
+                resource_version = obj.metadata.resource_version
+                if _is_available(obj):
+                    w.stop()
+                    return True
+        except client.exceptions.ApiException as e:
+            if e.status == 410:  # Resource version expired, start again from a fresh list
+                resource_version = None
+            else:
+                raise
+        if time.time() >= deadline:
+            return False
+
+def _poll_until_available(k8s_apps_v1, namespace: str, deployment_name: str, timeout: int, interval: int):
+    # Only needs the get verb, which roles without watch (and usually without list) still grant
+    deadline = time.time() + timeout
+    delay = 0.1
+    while True:
+        if _is_available(k8s_apps_v1.read_namespaced_deployment(name=deployment_name, namespace=namespace)):
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        time.sleep(min(delay + random.uniform(0, delay * 0.25), remaining))
+        delay = min(delay * 1.5, interval)
+
+def _watch_or_poll(k8s_apps_v1, namespace: str, deployment_name: str, timeout: int, interval: int):
+    try:
+        return _wait_until_available(k8s_apps_v1, namespace, deployment_name, timeout)
+    except client.exceptions.ApiException as e:
+        if e.status != 403:
+            raise
+        return _poll_until_available(k8s_apps_v1, namespace, deployment_name, timeout, interval)
+
 def monitor_deployment(branch_name: str, environment: str, deployment_name: str, timeout: int = 120, interval: int = 5):
     """
     Monitor the deployment of the git branch using the Kubernetes Python client.
+    The deployment is watched until it becomes available. If watching is forbidden, poll with
+    exponential backoff capped at the interval. If the deployment file was created with a readiness
+    callback, whichever of the callback and the watch answers first wins.
     Args:
         branch_name: The name of the branch to monitor.
         environment: The environment to monitor.
     """
     try:
-        config.load_kube_config()
-        k8s_apps_v1 = client.AppsV1Api()
         namespace = environment
-        start = time.time()
-        while time.time() - start < timeout:
-            resp = k8s_apps_v1.read_namespaced_deployment(name=deployment_name, namespace=namespace)
-            status = resp.status
-            if status.conditions:
-                for cond in status.conditions:
-                    if cond.type == "Available" and cond.status == "True":
-                        return True
-            time.sleep(interval)
-        return False
+        key = (namespace, deployment_name)
+        deadline = time.time() + timeout
+        k8s_apps_v1 = client.AppsV1Api(_get_api_client())
+        with _ready_cond:
+            registered = key in _ready_tokens.values()
+        if not registered:
+            return _watch_or_poll(k8s_apps_v1, namespace, deployment_name, timeout, interval)
+
+        outcome = {}
+        def watch_in_background():
+            try:
+                outcome['available'] = _watch_or_poll(k8s_apps_v1, namespace, deployment_name, timeout, interval)
+            except Exception as e:
+                outcome['error'] = e
+            with _ready_cond:
+                _ready_cond.notify_all()
+
+        threading.Thread(target=watch_in_background, daemon=True).start()
+        with _ready_cond:
+            _ready_cond.wait_for(lambda: key in _ready_reported or outcome, timeout=max(0, deadline - time.time()))
+            if key in _ready_reported:
+                return True
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome.get('available', False)
     except Exception as e:
         raise MonitorException(f'Failed to monitor the deployment of the branch {branch_name}: {e}')
 
-def build_docker_image(branch_name: str, temp_dir: str):
+async def build_docker_image(branch_name: str, temp_dir: str, push: bool = True):
+    """
+    Build the docker image on the cluster's BuildKit builder, reusing layers cached in the registry.
+    Args:
+        branch_name: The name of the branch to build.
+        temp_dir: The path to the cloned repository.
+        push: Whether to push the image to the registry as part of the build.
+    """
     try:
-        subprocess.run(["docker", "build", "-t", f"akhilspalli/agenticaitraining-{branch_name}:latest", "."],cwd=f"{temp_dir}", check=True)
+        await _ensure_builder()
+        await _build_async(f"akhilspalli/agenticaitraining-{branch_name}:latest", temp_dir, push)
+    except subprocess.CalledProcessError as e:
+        raise BuildException(f'Failed to build the docker image for the branch {branch_name}: {e.stderr.decode(errors="replace")[-2048:]}')
     except Exception as e:
         raise BuildException(f'Failed to build the docker image for the branch {branch_name}.')
 
-def push_docker_image(branch_name: str):
+async def push_docker_image(branch_name: str):
     image_tag = f"akhilspalli/agenticaitraining-{branch_name}:latest"
     try:
-        subprocess.run(["docker", "push", image_tag], check=True)
+        await _push_async(image_tag)
     except Exception as e:
         raise BuildException(f'Failed to push the docker image for the branch {branch_name}: {e}')
 
@@ -151,16 +547,40 @@ def create_deployment_file(deployment_content: str, branch_name: str, environmen
     Create a deployment file for the docker image.
     Args:
         deployment_content: The content of the deployment file in yaml format, inputted by the agent.
+            Pass an empty string to use the standard deployment template.
         branch_name: The name of the branch to deploy.
         environment: The environment to deploy to.
         deployment_name: The name of the deployment.
     Returns:
         The string path to the deployment file and the name of the deployment.
     """
-    PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
     deployment_file = os.path.join(PROJECT_ROOT, f"deployments-{branch_name}-{environment}.yaml")
-    with open(deployment_file, "w") as f:
-        f.write(deployment_content)
+    if not deployment_content:
+        deployment_content = _render_deployment_template(branch_name, deployment_name)
+    docs = _parse_manifest(deployment_content)
+    if READY_CALLBACK_HOST:
+        token = secrets.token_urlsafe(16)
+        callback_url = _ready_callback_url(token)
+        deployments = [doc for doc in docs if doc.get('kind') == "Deployment" and doc['metadata']['name'] == deployment_name]
+        added = bool(deployments) and _add_ready_sidecar(deployments[0], callback_url)
+        with _ready_cond:
+            key = (environment, deployment_name)
+            _ready_reported.discard(key)
+            # Only the newest file's token may report, and if nothing will call back monitor_deployment must not wait
+            for old_token in [t for t, k in _ready_tokens.items() if k == key]:
+                del _ready_tokens[old_token]
+            if added:
+                _ready_tokens[token] = key
+        if added:
+            deployment_content = yaml.dump_all(docs, Dumper=CSafeDumper, sort_keys=False)
+    fd = os.open(deployment_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        data = memoryview(deployment_content.encode())
+        while data:
+            data = data[os.write(fd, data):]
+        _manifests[deployment_file] = (os.fstat(fd).st_mtime_ns, docs)
+    finally:
+        os.close(fd)
     return str(deployment_file), deployment_name
 
 
@@ -177,16 +597,19 @@ deployment_agent = Agent(
     1. The user will provide the git branch name and the environment they wish to deploy to, they will also specify any specifications for the deployment. 
         You will need to:
         1. Create a temporary directory to clone the repository.
-        2. Clone the repository.
-        3. Checkout the git branch.
-        4. Build the docker image.
-        5. Push the docker image to the local registry.
+        2. Clone the repository with the git branch, this also checks out the branch.
+        3. The clone only contains the requested branch, to deploy a different branch clone the repository again with that branch.
+        4. Build the docker image, the build also pushes the docker image to the registry.
+        5. Only push the docker image with push_docker_image if it was built with push set to false.
         6. Write a deployment file for the docker image, the image name must follow the format "akhilspalli/agenticaitraining-{branch_name}:latest", use the create_deployment_file tool to create the deployment file.
+            Pass an empty deployment_content to use the standard template, unless the user asked for specific settings.
         6. Deploy the docker image to the local cluster called "local-cluster" in the namespace "<environment>".
         7. Clean up the temporary directory.
         8. Monitor the deployment and report the status to the user. If the 
         9. If the deployment fails, invoke the runbook agent.
         10. If the deployment succeeds, report the status to the user.
+        Building the docker image and writing the deployment file do not depend on each other, call
+        build_docker_image and create_deployment_file together so they run at the same time.
     2. If the runbook agent calls you, follow the following steps:
         1. Deploy the available deployment file to the local cluster called "local-cluster" in the namespace "<environment>".
         2. Clean up the temporary directory.
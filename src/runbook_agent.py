@@ -1,14 +1,17 @@
 from google.adk.agents import Agent
 import os
 
+PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+# Runbooks are static, so they are read once at import rather than on every tool call
+with open(os.path.join(PROJECT_ROOT, "runbooks", "image_pull_error.json"), "r") as f:
+    _RUNBOOK = f.read()
+
 def get_runbook(failure_summary: str):
     """
     Get the runbook for the failure.
     """
-    PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
-    runbook_path = os.path.join(PROJECT_ROOT, "runbooks", "image_pull_error.json")
-    with open(runbook_path, "r") as f:
-        return f.read()
+    return _RUNBOOK
 
 runbook_agent = Agent(
     name="runbook_agent",